@@ -7,6 +7,7 @@ from discord import app_commands
 from discord.ext import commands
 
 from settings import Settings
+from state import BotState
 
 
 class Event:
@@ -32,6 +33,7 @@ class Event:
 
 
 class CronChangedEventArgs:
+    guild_id: int = 0
     game_id: int = 0
     channel_id: int = 0
     is_opsec: int = 0
@@ -45,7 +47,8 @@ class CronChangedEventArgs:
 
 class CronChangedEvent(Event):
     async def trigger(self, interaction: discord.Interaction, game_id: int, is_opsec: int, channel_id: int, cron: str) -> None:
-        args = CronChangedEventArgs(game_id=game_id, channel_id=channel_id, is_opsec=is_opsec, cron=cron)
+        args = CronChangedEventArgs(guild_id=interaction.guild_id, game_id=game_id, channel_id=channel_id,
+                                    is_opsec=is_opsec, cron=cron)
         for callback in self.callbacks:
             await callback(interaction, args)
 
@@ -72,9 +75,10 @@ class Notifier(commands.Cog):
     on_cron_changed: CronChangedEvent
     on_cron_removed: CronRemovedEvent
 
-    def __init__(self, bot: commands.Bot, config: Settings) -> None:
+    def __init__(self, bot: commands.Bot, config: Settings, state: BotState) -> None:
         self.bot = bot
         self.config = config
+        self.state = state
         # Use these events to setting modifications from within this class, and instead leave that to the one
         # responsible for it
         self.on_cron_changed = CronChangedEvent()
@@ -89,7 +93,7 @@ class Notifier(commands.Cog):
 
         pretty_notifications = [
             (
-                game_id,
+                f"{self.state.games[int(game_id)]} ({game_id})" if int(game_id) in self.state.games else game_id,
                 "OPSEC" if is_opsec == self.config.OPSEC else "PUBLIC",
                 cron_descriptor.get_description(cron)
              ) for game_id, is_opsec, cron in notifications
@@ -6,7 +6,11 @@ import crontab
 import discord
 from discord.ext import commands, tasks
 import database
+from clock import Clock
+from publisher import DiscordPublisher, OperationsPayload, QueuePublisher
 from settings import Settings
+from state import BotState
+from timezone import OpservTimezone
 
 
 class OperationMessageOptions:
@@ -50,7 +54,13 @@ class OperationsEmbed:
 
         self.options = notification_options
 
-    async def send_operations(self, text_channel: discord.TextChannel, operations: list[database.Operation]) -> None:
+    @staticmethod
+    def format_date(date: datetime.datetime) -> str:
+        """Discord timestamp of an Opserv date. Opserv dates are naive and in its own timezone, not the host's"""
+        return discord.utils.format_dt(date.replace(tzinfo=OpservTimezone()))
+
+    def render(self, operations: list[database.OperationRecord]) -> discord.Embed:
+        """Add the operations to the embed"""
         if self.options.include_timestamp:
             # Get current timestamp
             # TODO: Should this be opserv time to make this consistent?
@@ -61,16 +71,16 @@ class OperationsEmbed:
             field_title = operation.operation_name
             lines = []
             if self.options.show_game:
-                lines.append(f"**{operation.game_id.game_name}**")
+                lines.append(f"**{operation.game_name}**")
 
             if self.options.show_leader:
-                lines.append(f"**Leader:** {operation.leader_user_id.username}")
+                lines.append(f"**Leader:** {operation.leader_username}")
 
             if self.options.show_date_start:
-                lines.append(f"**Start:** <t:{operation.date_start}>")
+                lines.append(f"**Start:** {self.format_date(operation.date_start)}")
 
             if self.options.show_date_end:
-                lines.append(f"**End:** <t:{operation.date_end}>")
+                lines.append(f"**End:** {self.format_date(operation.date_end)}")
 
             if self.options.show_opserv_link:
                 opserv_link = f"https://www.the-bwc.com/opserv/operation.php?id={operation.operation_id}&do=view"
@@ -82,94 +92,110 @@ class OperationsEmbed:
                 inline=False
             )
 
-        await text_channel.send(embed=self.embed)
+        return self.embed
 
 
 class OperationNotifier:
     bot: commands.Bot
     logger: Logger
+    clock: Clock
+    config: Settings
+    state: BotState
+    publisher: DiscordPublisher | QueuePublisher
+    operations: database.OpservOperations
+
+    def __init__(self, bot: commands.Bot | None, config: Settings, logger: Logger, clock: Clock | None = None,
+                 state: BotState | None = None, publisher: DiscordPublisher | QueuePublisher | None = None,
+                 operations: database.OpservOperations | None = None) -> None:
+        """Dependencies default to the production ones, the simulation and the worker pass their own"""
+        self.bot = bot
+        self.config = config
+        self.logger = logger
+        self.clock = clock or Clock()
+        self.state = state or BotState()
+        self.publisher = publisher or DiscordPublisher(bot, config, self.state, logger)
+        self.operations = operations or database.OpservOperations()
+
     async def send_operations(self,
                               embed_title:str,
                               channels: list[int],
-                              operations: list[database.Operation],
+                              operations: list[database.OperationRecord],
                               notification_options: OperationMessageOptions = NOTIFICATION_OPTIONS['UPCOMING_OPS']
-                              ) -> list[database.Operation]:
+                              ) -> list[int]:
         """
         Send operation notifications in a message with the given title.
-        :returns Array of operations that were processed
+        :returns The ids of the channels the message was posted to
         """
-        operations_notified = []
         if len(operations) == 0:
-            return operations_notified
-
-        for channel in channels:
-            text_channel = await self.bot.fetch_channel(channel)
-
-            if text_channel is None:
-                self.logger.error(f"Channel {text_channel} not found.")
-                continue
-
-            embed = OperationsEmbed(embed_title, notification_options)
-            await embed.send_operations(text_channel, operations)
-            operations_notified.extend(operations)
+            return []
 
-        return operations_notified
+        # The message is the same for every channel, so it is only rendered once
+        embed = OperationsEmbed(embed_title, notification_options).render(operations)
+        payload = OperationsPayload([int(channel) for channel in channels], embed.to_dict())
+        return await self.publisher.publish(payload)
 
 
 class Operation30Notifier(commands.Cog, OperationNotifier):
-    def __init__(self, bot: commands.Bot, config: Settings, logger: Logger) -> None:
-        self.bot = bot
-        self.config = config
-        self.logger = logger
+    async def cog_load(self) -> None:
         self.send.start()
 
     async def cog_unload(self) -> None:
         self.send.stop()
 
-    def get_operations(self, game_id: int, is_opsec: bool, exclude: list[int]) -> list[database.Operation]:
-        # Mindful with boolean conditions here. We cannot use proper "pythonic" conditions like
-        # `operation_model.is_complete is False` because it doesn't translate properly in the SQL query
-        now = datetime.datetime.now()
-        now = now.replace(second=0, microsecond=0)
+    def get_operations(self, game_id: int, is_opsec: bool, now: datetime.datetime) -> list[database.OperationRecord]:
+        """
+        Return the operations starting in the next 30 minutes. Operations that already started are left out, also
+        right after a restart, since they can't be announced as starting anymore
+        """
         deadline = now + datetime.timedelta(minutes=30)
+        return self.operations.select(game_id, is_opsec, now, deadline)
 
-        operation_model = database.Operation
-        return operation_model.select().where(operation_model.game_id == game_id,
-                operation_model.is_completed == False,
-                operation_model.is_opsec == is_opsec,
-                operation_model.date_start.truncate("minute") >= now,
-                operation_model.date_start.truncate("minute") <= deadline,
-                operation_model.operation_id not in exclude).order_by(operation_model.date_start)
+    def get_notified_channels(self, now: datetime.datetime) -> set[tuple[int, int]]:
+        """Return the operation/channel pairs of the upcoming operations that already had their reminder sent"""
+        notification_model = database.Notification30
+        notified = notification_model.select(notification_model.operation_id, notification_model.channel_id) \
+            .where(notification_model.date_start >= now).tuples()
+        return set(notified)
+
+    def save_notified_channels(self, notified: list[tuple[database.OperationRecord, int]]) -> None:
+        """Remember the channels we sent a reminder to so the next iteration filters them out"""
+        rows = [
+            {'operation_id': op.operation_id, 'channel_id': channel, 'date_start': op.date_start}
+            for op, channel in notified
+        ]
+        database.Notification30.insert_many(rows).on_conflict_ignore().execute()
 
     @tasks.loop(minutes=3)
-    async def send(self) -> [database.Operation]:
+    async def send(self) -> None:
+        # The notified channels and the pending operations share the same lower bound, so that every operation in the
+        # window is checked against what was already sent
+        now = self.clock.now().replace(second=0, microsecond=0)
         # Get already notified data so that we can filter those out
-        notification_model = database.Notification30
-        notified_ops = notification_model.select(notification_model.operation_id) \
-            .where(notification_model.date_start >= datetime.datetime.now())
-        notified_ops_ids = list(map(lambda op: op.operation_id, notified_ops))
+        notified = self.get_notified_channels(now)
 
         notifications_sent = []
-        for game, data in self.config.opsec_channels_map.items():
+        for game, data in self.config.get_owned_channels_map().items():
             for access, channels in data.items():
-                # Here we are pasing the notified_ops_ids so that they are filtered from the pending notif
-                pending_notifications = self.get_operations(game, access, notified_ops_ids)
-                operations = await super().send_operations("Operations starting in 30 minutes!",
-                                                           channels=channels,
-                                                           operations=pending_notifications,
-                                                           notification_options=NOTIFICATION_OPTIONS['30MIN_OPS'])
-
-                notifications_sent.extend(operations)
-
-        # Save the data of those operations we notified
+                operations = self.get_operations(game, access, now)
+                # Channels still missing the same operations share a message
+                pending: {tuple[int, ...]: tuple[list[database.OperationRecord], list[int]]} = {}
+                for channel in channels:
+                    channel_operations = [op for op in operations if (op.operation_id, int(channel)) not in notified]
+                    if channel_operations:
+                        operation_ids = tuple(op.operation_id for op in channel_operations)
+                        pending.setdefault(operation_ids, (channel_operations, []))[1].append(int(channel))
+
+                for pending_operations, pending_channels in pending.values():
+                    sent = await super().send_operations("Operations starting in 30 minutes!",
+                                                         channels=pending_channels,
+                                                         operations=pending_operations,
+                                                         notification_options=NOTIFICATION_OPTIONS['30MIN_OPS'])
+
+                    notifications_sent.extend((op, channel) for op in pending_operations for channel in sent)
+
+        # Save the channels we notified
         if notifications_sent:
-            op_data = []
-            for op in operations:
-                op_data.append({'operation_id': op.operation_id, 'date_start': op.date_start})
-
-            return op_data
-
-        return []
+            self.save_notified_channels(notifications_sent)
 
 
 class NotificationTask:
@@ -209,21 +235,21 @@ class NotificationTask:
 class UpcomingOperationsNotifier(commands.Cog, OperationNotifier):
     tasks: {str: asyncio.Task}
 
-    def __init__(self, bot: commands.Bot, config: Settings, logger: Logger) -> None:
-        self.bot = bot
-        self.config = config
-        self.logger = logger
+    def __init__(self, bot: commands.Bot | None, config: Settings, logger: Logger, clock: Clock | None = None,
+                 state: BotState | None = None, publisher: DiscordPublisher | QueuePublisher | None = None,
+                 operations: database.OpservOperations | None = None) -> None:
+        super().__init__(bot, config, logger, clock, state, publisher, operations)
         self.tasks = {}
         self.setup()
 
     def create_task(self, game: int, is_opsec: int, channel: int, cron: str) -> NotificationTask:
         # This creates and starts a task at the same time
-        task = self.bot.loop.create_task(self.__send(game, is_opsec, cron, [channel]))
+        task = asyncio.create_task(self.__send(game, is_opsec, cron, [channel]))
         # Encapsulate it in our own class just for ease of access later
         return NotificationTask(game, is_opsec, channel, task)
 
     def setup(self) -> None:
-        for game, data in self.config.opsec_channels_map.items():
+        for game, data in self.config.get_owned_channels_map().items():
             for is_opsec, channels in data.items():
                 for channel, cron in channels.items():
                     notification_task = self.create_task(game, is_opsec, channel, cron)
@@ -239,27 +265,66 @@ class UpcomingOperationsNotifier(commands.Cog, OperationNotifier):
     async def cog_unload(self) -> None:
         self.stop()
 
-    def get_operations(self, game_id: int, is_opsec: bool) -> list[database.Operation]:
-        operation_model = database.Operation
-        now = datetime.datetime.now().replace(second=0, minute=0)
-        return operation_model.select().where(
-            operation_model.game_id == game_id,
-            operation_model.is_opsec == is_opsec,
-            operation_model.is_completed == False,
-            operation_model.date_start.truncate("minute") >= now
-        )
+    def get_operations(self, game_id: int, is_opsec: bool) -> list[database.OperationRecord]:
+        now = self.clock.now().replace(second=0, minute=0, microsecond=0)
+        operations = self.operations.select(game_id, is_opsec, now)
+        # Keep the latest result around so a restart can serve from it before Opserv is queried again
+        self.state.set_operations(game_id, is_opsec, operations)
+        return operations
+
+    def refresh_operations(self) -> None:
+        """Query the upcoming operations of every subscribed game so the state snapshot is up to date"""
+        for game, data in self.config.get_owned_channels_map().items():
+            for is_opsec in data:
+                self.get_operations(game, is_opsec)
+
+    async def notify(self, game: int, is_opsec: int, channels: [int], ops: list[database.OperationRecord]) -> None:
+        title = "OPSEC" if is_opsec == self.config.OPSEC else "Public"
+        await super().send_operations(f"{title} Operations", channels=channels, operations=ops)
+
+        now = self.clock.now()
+        for channel in channels:
+            self.state.last_fired[NotificationTask.get_id(game, is_opsec, channel)] = now
+
+        # Saved right away, a restart within the snapshot interval would otherwise send it again when catching up
+        self.state.save((BotState.LAST_FIRED,))
+
+    async def catch_up(self) -> None:
+        """
+        Send a single message for every notification that should have fired while the bot was offline, using the
+        operations snapshot of the state instead of querying Opserv
+        """
+        now = self.clock.now()
+        since = now.replace(second=0, minute=0, microsecond=0)
+        missed = []
+        for game, data in self.config.get_owned_channels_map().items():
+            for is_opsec, channels in data.items():
+                for channel, schedule in channels.items():
+                    last_fired = self.state.last_fired.get(NotificationTask.get_id(game, is_opsec, channel), None)
+                    if last_fired is None:
+                        continue
+
+                    next_run = crontab.CronTab(schedule).next(now=last_fired, default_utc=False)
+                    if last_fired + datetime.timedelta(seconds=next_run) > now:
+                        continue
+
+                    ops = self.state.get_operations(game, is_opsec, since)
+                    missed.append(self.notify(game, is_opsec, [channel], ops))
+
+        if missed:
+            self.logger.info("Catching up %s missed notifications", len(missed))
+            await asyncio.gather(*missed)
 
     async def __send(self, game: int, is_opsec: int, schedule: str, channels: [int]) -> None:
         # This is the work for the task related to a single notification
         cron = crontab.CronTab(schedule)
         while True:
             # sleep until next execution to avoid using cpu cycles
-            next_run = cron.next()
+            next_run = cron.next(now=self.clock.now(), default_utc=False)
             await asyncio.sleep(next_run)
 
             ops = self.get_operations(game, is_opsec)
-            title = "OPSEC" if is_opsec == self.config.OPSEC else "Public"
-            await super().send_operations(f"{title} Operations", channels=channels, operations=ops)
+            await self.notify(game, is_opsec, channels, ops)
 
     def update_task(self, game_id: int, is_opsec: int, channel: int, cron: str) -> None:
         """Stop any existing task with the same id and creates a new one"""
@@ -1,6 +1,10 @@
+import asyncio
+import hashlib
+import json
 import random
 import platform
 import os
+import signal
 
 import cron_descriptor
 import discord
@@ -9,6 +13,9 @@ from discord.ext import tasks, commands
 import settings
 import bot_logger
 import database
+import worker
+from publisher import DiscordPublisher
+from state import BotState
 
 from Cogs.notifier_command import Notifier, CronChangedEventArgs, CronRemovedEventArgs
 from Cogs.operation_notification import Operation30Notifier, UpcomingOperationsNotifier
@@ -17,9 +24,12 @@ if settings.DISCORD_BOT_TOKEN is None:
     raise ValueError("DISCORD_BOT_TOKEN is not set in the environment variables.")
 
 
-class DiscordBot(commands.Bot):
+class DiscordBot(commands.AutoShardedBot):
     notifier_30: Operation30Notifier
     notifier_upcoming: UpcomingOperationsNotifier
+    warm_start_task: asyncio.Task = None
+    consumer_task: asyncio.Task = None
+    close_task: asyncio.Task = None
 
     intents = discord.Intents.default()
     command_prefix = '!'
@@ -27,11 +37,15 @@ class DiscordBot(commands.Bot):
     def __init__(self) -> None:
         self.intents.message_content = True
         super().__init__(command_prefix=self.command_prefix,
-            intents=self.intents
+            intents=self.intents,
+            shard_count=settings.SHARD_COUNT,
+            shard_ids=settings.SHARD_IDS
         )
         self.logger = bot_logger.logger
         self.config = settings
         self.settings = settings.Settings()
+        self.state = BotState()
+        self.worker = None
         self.database = None
 
     @tasks.loop(minutes=1.0)
@@ -49,6 +63,51 @@ class DiscordBot(commands.Bot):
     async def before_status_task(self) -> None:
         await self.wait_until_ready()
 
+    @tasks.loop(minutes=5.0)
+    async def snapshot_task(self) -> None:
+        self.save_state()
+
+    def save_state(self) -> None:
+        # With a worker, the bot process only keeps track of the channels
+        self.state.save((BotState.CHANNELS,) if self.worker else None)
+
+    async def warm_start(self) -> None:
+        """Send what was missed while offline from the saved state, then refresh the state from Opserv"""
+        try:
+            await self.notifier_upcoming.catch_up()
+            self.state.refresh_games()
+            self.notifier_upcoming.refresh_operations()
+            self.save_state()
+        except Exception:
+            self.logger.exception("Warm start failed, notifications will refresh on their next run")
+
+    def register_signal_handlers(self) -> None:
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, self.handle_sigterm)
+        except NotImplementedError:
+            # Event loops on Windows don't support signal handlers
+            pass
+
+    def handle_sigterm(self) -> None:
+        # docker stop sends SIGTERM, which discord.py doesn't handle, so the state would not be saved
+        self.logger.info("Received SIGTERM, shutting down")
+        if self.close_task is None:
+            self.close_task = self.loop.create_task(self.close())
+
+    async def close(self) -> None:
+        if self.is_closed():
+            return
+
+        try:
+            if self.worker:
+                await self.worker.stop()
+                # A consumer failure was already logged, it must not keep the state from being saved
+                if self.consumer_task is not None:
+                    await asyncio.gather(self.consumer_task, return_exceptions=True)
+        finally:
+            self.save_state()
+            await super().close()
+
     async def setup_hook(self) -> None:
         self.logger.info("Logged in as %s", self.user.name)
         self.logger.info("discord.py version: %s", discord.__version__)
@@ -56,22 +115,62 @@ class DiscordBot(commands.Bot):
         self.logger.info("Running on %s", f"{platform.system()} {platform.release()} ({os.name})")
         self.logger.info("-------------------")
         self.status_task.start()
+        self.register_signal_handlers()
         self.database = database
-
-        # Create notifiers
-        self.notifier_30 = Operation30Notifier(self, self.settings, self.logger)
-        self.notifier_upcoming = UpcomingOperationsNotifier(self, self.settings, self.logger)
+        self.state.load()
+        publisher = DiscordPublisher(self, self.settings, self.state, self.logger)
+
+        # Create notifiers, or the worker running them
+        self.worker = worker.create_worker(settings.WORKER_MODE, self.logger)
+        if self.worker:
+            self.worker.start()
+            consumer = worker.consume_payloads(self.worker, publisher, self.state, self.logger)
+            self.consumer_task = self.loop.create_task(consumer)
+        else:
+            self.notifier_30 = Operation30Notifier(self, self.settings, self.logger, state=self.state,
+                                                   publisher=publisher)
+            self.notifier_upcoming = UpcomingOperationsNotifier(self, self.settings, self.logger, state=self.state,
+                                                                publisher=publisher)
+            await self.add_cog(self.notifier_30)
 
         # Setup commands
-        notifier_command = Notifier(self, self.settings)
+        notifier_command = Notifier(self, self.settings, self.state)
         await self.add_cog(notifier_command)
         notifier_command.on_cron_changed += self.on_cron_changed
         notifier_command.on_cron_removed += self.on_cron_removed
 
         # Trigger sync to update slash commands
-        guild = discord.Object(id=settings.GUILD_ID)
-        self.tree.copy_global_to(guild=guild)
-        await self.tree.sync(guild=guild)
+        await self.sync_commands()
+
+        # Everything above only needed the saved state, the rest runs in the background
+        self.snapshot_task.start()
+        if not self.worker:
+            self.warm_start_task = self.loop.create_task(self.warm_start())
+
+    async def sync_commands(self) -> None:
+        """
+        Sync the slash commands to each configured guild handled by this process, or globally when there are none.
+        Guilds whose commands didn't change since the last sync are skipped
+        """
+        for guild_id in settings.GUILD_IDS or [0]:
+            # Each guild is synced, and its CommandSync row written, only by the process owning its shard, so the shard
+            # processes sharing the bot database never write the same row
+            if not settings.is_guild_owned(guild_id):
+                continue
+
+            guild = discord.Object(id=guild_id) if guild_id else None
+            if guild is not None:
+                self.tree.copy_global_to(guild=guild)
+
+            commands_payload = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)]
+            digest = hashlib.sha256(json.dumps(commands_payload, sort_keys=True).encode('utf-8')).hexdigest()
+            command_sync = database.CommandSync.get_or_none(database.CommandSync.guild_id == guild_id)
+            if command_sync is not None and command_sync.digest == digest:
+                continue
+
+            await self.tree.sync(guild=guild)
+            database.CommandSync.replace(guild_id=guild_id, digest=digest).execute()
+            self.logger.info("Synced slash commands for guild %s", guild_id)
 
     async def on_cron_removed(self, interaction: discord.Interaction, args: CronRemovedEventArgs) -> None:
         """Event callback used to modify the settings object to remove cron entries"""
@@ -80,15 +179,23 @@ class DiscordBot(commands.Bot):
             await interaction.response.send_message(f"Could not find {opsec_text} notification for game {args.game_id}")
             return
 
-        self.notifier_upcoming.stop_task(args.game_id, args.is_opsec, args.channel_id)
+        if self.worker:
+            self.worker.changes.put(worker.NotificationChange(args.game_id, args.is_opsec, args.channel_id))
+        else:
+            self.notifier_upcoming.stop_task(args.game_id, args.is_opsec, args.channel_id)
+
         await interaction.response.send_message(f"{opsec_text} notification removed for game {args.game_id}")
 
     async def on_cron_changed(self, interaction: discord.Interaction, args: CronChangedEventArgs) -> None:
         """Event callback used to modify the settings object to add or update cron entries"""
         # Because here we will need a mix of both the crontab object AND the string, we should get the string instead
         # of the cron object and just recreate it
-        is_new = self.settings.update_notification(args.game_id, args.is_opsec, args.channel_id, args.cron)
-        self.notifier_upcoming.update_task(args.game_id, args.is_opsec, args.channel_id, args.cron)
+        guild_id = args.guild_id or settings.DEFAULT_GUILD_ID
+        is_new = self.settings.update_notification(guild_id, args.game_id, args.is_opsec, args.channel_id, args.cron)
+        if self.worker:
+            self.worker.changes.put(worker.NotificationChange(args.game_id, args.is_opsec, args.channel_id, args.cron))
+        else:
+            self.notifier_upcoming.update_task(args.game_id, args.is_opsec, args.channel_id, args.cron)
 
         opsec_text = "OPSEC" if args.is_opsec else "PUBLIC"
         msg = f"Added {opsec_text} notification" if is_new == 1 else f"Updated {opsec_text} notification"
@@ -96,5 +203,7 @@ class DiscordBot(commands.Bot):
         await interaction.response.send_message(f"{msg}: {cron_text}")
 
 
-bot = DiscordBot()
-bot.run(settings.DISCORD_BOT_TOKEN)
+# The worker process imports this module again when it starts, so the bot must only run from the main process
+if __name__ == '__main__':
+    bot = DiscordBot()
+    bot.run(settings.DISCORD_BOT_TOKEN)
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import settings
 
 
@@ -39,8 +40,9 @@ logger.setLevel(settings.LOG_LEVEL)
 # Console handler
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(LoggingFormatter())
-# File handler
-file_handler = logging.FileHandler(filename="discord.log", encoding="utf-8", mode="w")
+# File handler. The worker process appends so it doesn't wipe what the bot process already logged
+file_mode = "w" if multiprocessing.parent_process() is None else "a"
+file_handler = logging.FileHandler(filename="discord.log", encoding="utf-8", mode=file_mode)
 file_handler_formatter = logging.Formatter(
     "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
 )
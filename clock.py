@@ -0,0 +1,7 @@
+import datetime
+
+
+class Clock:
+    """Source of the current time for the notifiers. The simulation swaps it for a virtual clock"""
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now()
@@ -1,5 +1,7 @@
 from peewee import Model, MySQLDatabase, IntegerField, CharField, BooleanField, DateTimeField, ForeignKeyField, \
-    SqliteDatabase
+    SqliteDatabase, TextField, CompositeKey, JOIN, fn
+import datetime
+
 import settings
 
 
@@ -53,15 +55,115 @@ class Operation(Model):
         table_name = "opserv_operations"
 
 
+class OperationRecord:
+    """
+    Read-only row used by the notifiers instead of full Operation instances. The game name and leader username are
+    resolved by the query, so rendering never triggers a lazy foreign key lookup
+    """
+    __slots__ = ('date_end', 'date_start', 'game_id', 'game_name', 'is_opsec', 'leader_username', 'operation_id',
+                 'operation_name')
+
+    def __init__(self, operation_id: int, operation_name: str, date_start, date_end, game_id: int, is_opsec: bool,
+                 game_name: str, leader_username: str) -> None:
+        self.operation_id = operation_id
+        self.operation_name = operation_name
+        self.date_start = date_start
+        self.date_end = date_end
+        self.game_id = game_id
+        self.is_opsec = is_opsec
+        self.game_name = game_name
+        self.leader_username = leader_username
+
+    def __repr__(self) -> str:
+        return f"OperationRecord({self.operation_id}, {self.operation_name!r})"
+
+
+def select_operation_records(*conditions) -> list[OperationRecord]:
+    """
+    Fetch the operations matching the given conditions ordered by start date. Rows are read as plain tuples with the
+    game and leader joined in, and packed into OperationRecord. Operations whose game or leader row is missing are
+    still returned, with a placeholder name
+    """
+    query = (Operation
+             .select(Operation.operation_id,
+                     Operation.operation_name,
+                     Operation.date_start,
+                     Operation.date_end,
+                     Operation.game_id,
+                     Operation.is_opsec,
+                     fn.COALESCE(Game.game_name, "Unknown game"),
+                     fn.COALESCE(User.username, "Unknown leader"))
+             .join(Game, JOIN.LEFT_OUTER)
+             .switch(Operation)
+             .join(User, JOIN.LEFT_OUTER)
+             .where(*conditions)
+             .order_by(Operation.date_start)
+             .tuples())
+    return [OperationRecord(*row) for row in query]
+
+
+class OpservOperations:
+    """Source of the operations the notifiers send, backed by the Opserv tables"""
+    def select(self, game_id: int, is_opsec: bool, start: datetime.datetime, end: datetime.datetime | None = None,
+               exclude: list[int] | None = None) -> list[OperationRecord]:
+        """Return the open operations of the game/access pair starting from `start`, and up to `end` when given"""
+        # Mindful with boolean conditions here. We cannot use proper "pythonic" conditions like
+        # `Operation.is_complete is False` because it doesn't translate properly in the SQL query
+        conditions = [
+            Operation.game_id == game_id,
+            Operation.is_opsec == is_opsec,
+            Operation.is_completed == False,
+            Operation.date_start.truncate("minute") >= start
+        ]
+        if end is not None:
+            conditions.append(Operation.date_start.truncate("minute") <= end)
+
+        if exclude:
+            conditions.append(Operation.operation_id.not_in(exclude))
+
+        return select_operation_records(*conditions)
+
+
 class Notification30(Model):
-    """Notification model for the 30 reminder sent for operations"""
-    operation_id = IntegerField(primary_key=True)
+    """
+    Notification model for the 30 reminder sent for operations. Reminders are recorded per channel, since the shard
+    processes sharing the bot database each post to the channels of their own guilds
+    """
+    operation_id = IntegerField()
+    channel_id = IntegerField()
     date_start = DateTimeField()
 
+    class Meta:
+        database = bot
+        primary_key = CompositeKey('operation_id', 'channel_id')
+
+
+class BotSnapshot(Model):
+    """Warm restart state of the bot, stored as one JSON payload per key"""
+    key = CharField(primary_key=True)
+    payload = TextField()
+    updated_at = DateTimeField()
+
+    class Meta:
+        database = bot
+
+
+class CommandSync(Model):
+    """Digest of the slash commands last synced to a guild, guild 0 being the global commands"""
+    guild_id = IntegerField(primary_key=True)
+    digest = CharField()
+
     class Meta:
         database = bot
 
 
 # Make sure the database exists and the schemas are created
 bot.connect()
-bot.create_tables([Notification30])
+# Reminders used to be recorded once per operation. Those rows can't tell which channels got the reminder, so the
+# table is recreated with a row per channel
+notification30_table = Notification30._meta.table_name
+if bot.table_exists(notification30_table) and \
+        'channel_id' not in [column.name for column in bot.get_columns(notification30_table)]:
+    bot.drop_tables([Notification30])
+
+bot.create_tables([Notification30, BotSnapshot, CommandSync])
@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import queue
+from logging import Logger
+
+import discord
+from discord.ext import commands
+
+import settings
+from settings import Settings
+from state import BotState
+
+
+class OperationsPayload:
+    """A rendered operations message, ready to be posted to the given channels"""
+    __slots__ = ('channel_ids', 'embed', 'payload_id')
+
+    def __init__(self, channel_ids: list[int], embed: dict, payload_id: int | None = None) -> None:
+        self.channel_ids = channel_ids
+        self.embed = embed
+        self.payload_id = payload_id
+
+
+class PayloadAck:
+    """Sent back by the process running the bot once it posted a queued payload"""
+    __slots__ = ('channel_ids', 'payload_id')
+
+    def __init__(self, payload_id: int, channel_ids: list[int]) -> None:
+        self.payload_id = payload_id
+        self.channel_ids = channel_ids
+
+
+class DiscordPublisher:
+    """Posts payloads to Discord. Only usable in the process running the bot"""
+    bot: commands.Bot
+    config: Settings
+    state: BotState
+    logger: Logger
+
+    def __init__(self, bot: commands.Bot, config: Settings, state: BotState, logger: Logger) -> None:
+        self.bot = bot
+        self.config = config
+        self.state = state
+        self.logger = logger
+
+    async def get_text_channel(self, channel_id: int) -> discord.abc.Messageable | None:
+        """Resolve a channel, skipping the API fetch for channels that were already resolved before"""
+        channel_id = int(channel_id)
+        if channel_id in self.state.channel_ids:
+            return self.bot.get_partial_messageable(channel_id)
+
+        try:
+            text_channel = await self.bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+
+        self.state.channel_ids.add(channel_id)
+        return text_channel
+
+    async def publish(self, payload: OperationsPayload) -> list[int]:
+        """
+        Post the payload to its channels
+        :returns The ids of the channels the message was posted to
+        """
+        shards_channels: {int: list[int]} = {}
+        for channel in payload.channel_ids:
+            shard_id = settings.get_shard_id(self.config.get_channel_guild(channel), self.bot.shard_count)
+            shards_channels.setdefault(shard_id, []).append(channel)
+
+        # Each shard sends to its own channels in order, while the shards run concurrently
+        shards_sent = await asyncio.gather(*[
+            self.publish_shard(shard_channels, payload.embed) for shard_channels in shards_channels.values()
+        ])
+        return [channel for sent in shards_sent for channel in sent]
+
+    async def publish_shard(self, channels: list[int], embed: dict) -> list[int]:
+        """Post the embed to channels of the same shard, one after the other"""
+        sent = []
+        for channel in channels:
+            text_channel = await self.get_text_channel(channel)
+
+            if text_channel is None:
+                self.logger.error(f"Channel {channel} not found.")
+                continue
+
+            try:
+                await text_channel.send(embed=discord.Embed.from_dict(embed))
+            except discord.NotFound:
+                # The channel was deleted since we resolved it, so it has to be fetched again next time
+                self.state.channel_ids.discard(int(channel))
+                self.logger.error(f"Channel {channel} not found.")
+                continue
+            except discord.HTTPException:
+                # Missing permissions or a Discord error, the other channels still get the message
+                self.logger.exception(f"Failed to post to channel {channel}.")
+                continue
+
+            sent.append(channel)
+
+        return sent
+
+
+class QueuePublisher:
+    """
+    Hands payloads over to the process running the bot, which posts them with a DiscordPublisher and acknowledges
+    each of them with the channels it was posted to
+    """
+    # Seconds to wait for the bot to acknowledge a payload before it's considered not delivered
+    ACK_TIMEOUT = 300.0
+
+    payloads: queue.Queue
+    logger: Logger
+    pending: {int: asyncio.Future}
+
+    def __init__(self, payloads: queue.Queue, logger: Logger) -> None:
+        self.payloads = payloads
+        self.logger = logger
+        self.pending = {}
+        self.payload_ids = itertools.count()
+
+    async def publish(self, payload: OperationsPayload) -> list[int]:
+        """
+        Queue the payload for the bot process and wait for it to be posted
+        :returns The ids of the channels the message was posted to
+        """
+        payload.payload_id = next(self.payload_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[payload.payload_id] = future
+        try:
+            self.payloads.put(payload)
+            return await asyncio.wait_for(future, self.ACK_TIMEOUT)
+        except TimeoutError:
+            self.logger.error("Payload %s was not acknowledged in time, it's considered not delivered",
+                              payload.payload_id)
+            return []
+        finally:
+            del self.pending[payload.payload_id]
+
+    def acknowledge(self, ack: PayloadAck) -> None:
+        future = self.pending.get(ack.payload_id, None)
+        # The publish may have been cancelled while the bot was posting
+        if future is not None and not future.done():
+            future.set_result(ack.channel_ids)
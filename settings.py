@@ -1,6 +1,13 @@
+import contextlib
 import json
 import os
 
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, settings.json is then only safe with a single bot process
+    fcntl = None
+
 if 'DEVELOPMENT' in os.environ:
     from dotenv import load_dotenv
     load_dotenv()
@@ -16,25 +23,60 @@ LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
 # Database
 XENFORO_DB_HOST = os.getenv('XENFORO_DB_HOST')
-XENFORO_DB_PORT = os.getenv('XENFORO_DB_PORT')
+XENFORO_DB_PORT = os.getenv('XENFORO_DB_PORT', '3306')
 XENFORO_DB_NAME = os.getenv('XENFORO_DB_NAME')
 XENFORO_DB_USER = os.getenv('XENFORO_DB_USER')
 XENFORO_DB_PASS = os.getenv('XENFORO_DB_PASS')
 
 # Bot settings
-GUILD_ID = 0
+# Comma separated ids of the guilds slash commands are synced to. The first one owns notifications created before
+# guilds were tracked
+GUILD_IDS = [int(guild_id) for guild_id in os.getenv('GUILD_IDS', '').split(',') if guild_id]
+DEFAULT_GUILD_ID = GUILD_IDS[0] if GUILD_IDS else 0
 BOT_DB_NAME = "botdb"
 
+# Sharding. Leave both unset to let Discord pick the shard count and run every shard in this process. SHARD_IDS
+# limits this process to some of the shards, in which case SHARD_COUNT is required
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS').split(',')] if os.getenv('SHARD_IDS') else None
+
+# Where the Opserv queries and rendering run: single (in the bot), process (in a worker process) or local (in a worker
+# task of the bot process, for tests)
+WORKER_MODE = os.getenv('WORKER_MODE') or 'single'
+
+if SHARD_IDS is not None and SHARD_COUNT is None:
+    raise ValueError("SHARD_COUNT must be set when SHARD_IDS is set.")
+
+
+def get_shard_id(guild_id: int, shard_count: int | None) -> int:
+    """Returns the shard Discord routes the guild to"""
+    if not shard_count:
+        return 0
+
+    return (int(guild_id) >> 22) % shard_count
+
+
+def is_guild_owned(guild_id: int) -> bool:
+    """Whether the guild is handled by one of the shards of this process"""
+    if SHARD_IDS is None:
+        return True
+
+    return get_shard_id(guild_id, SHARD_COUNT) in SHARD_IDS
+
 
 class Settings:
     # Game/channels map data.
     OPSEC = '1'
     PUBLIC = '0'
     SETTINGS_FILENAME = "settings.json"
+    LOCK_FILENAME = "settings.json.lock"
 
-    opsec_channels_map: {int: {int: {int: str}}} = {}
+    opsec_channels_map: {int: {int: {int: str}}}
+    channel_guilds: {int: int}
 
     def __init__(self) -> None:
+        self.opsec_channels_map = {}
+        self.channel_guilds = {}
         self.load()
 
     def load(self) -> None:
@@ -47,12 +89,50 @@ class Settings:
         # move things to memory
         channels_map = contents.get('opsec_channels_map', {})
         self.opsec_channels_map = channels_map
+        self.channel_guilds = contents.get('channel_guilds', {})
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Hold the settings file lock and reload the file, so changes made by the other shard processes sharing
+        settings.json are merged instead of overwritten by the save
+        """
+        with open(self.LOCK_FILENAME, 'a', encoding='utf-8') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
 
     def save(self) -> None:
         with open(self.SETTINGS_FILENAME, 'w', encoding='utf-8') as settings_file:
-            settings_content = {'opsec_channels_map': self.opsec_channels_map}
+            settings_content = {'opsec_channels_map': self.opsec_channels_map, 'channel_guilds': self.channel_guilds}
             settings_file.write(json.dumps(settings_content, indent=2))
 
+    def get_channel_guild(self, channel_id: int) -> int:
+        """Return the guild the channel belongs to. Channels added before guilds were tracked use the default guild"""
+        return int(self.channel_guilds.get(str(channel_id), DEFAULT_GUILD_ID))
+
+    def get_owned_channels_map(self) -> {int: {int: {int: str}}}:
+        """Return the channels map limited to the channels of the guilds handled by this process' shards"""
+        if SHARD_IDS is None:
+            return self.opsec_channels_map
+
+        owned_map = {}
+        for game_id, data in self.opsec_channels_map.items():
+            for is_opsec, channels in data.items():
+                owned_channels = {
+                    channel: cron for channel, cron in channels.items()
+                    if is_guild_owned(self.get_channel_guild(channel))
+                }
+                if owned_channels:
+                    owned_map.setdefault(game_id, {})[is_opsec] = owned_channels
+
+        return owned_map
+
     def get_channel_notifications(self, channel_id: int) -> list[tuple[int, int, str]]:
         """Return the current notifications defined for the given channel"""
         results: list[tuple[int, int, str]] = []
@@ -76,23 +156,27 @@ class Settings:
         game_id_str = str(game_id)
         is_opsec_str = str(is_opsec)
         channel_id_str = str(channel_id)
-        game_map = self.opsec_channels_map.get(game_id_str, None)
-        if game_map is None:
-            return False
+        with self.locked():
+            game_map = self.opsec_channels_map.get(game_id_str, None)
+            if game_map is None:
+                return False
 
-        opsec_map = game_map.get(is_opsec_str, None)
-        if opsec_map is None:
-            return False
+            opsec_map = game_map.get(is_opsec_str, None)
+            if opsec_map is None:
+                return False
 
-        channel = opsec_map.get(channel_id_str, None)
-        if channel is None:
-            return False
+            channel = opsec_map.get(channel_id_str, None)
+            if channel is None:
+                return False
 
-        del self.opsec_channels_map[game_id_str][is_opsec_str][channel_id_str]
-        self.save()
-        return True
+            del self.opsec_channels_map[game_id_str][is_opsec_str][channel_id_str]
+            if not self.get_channel_notifications(channel_id):
+                self.channel_guilds.pop(channel_id_str, None)
 
-    def update_notification(self, game_id: int, is_opsec: int, channel_id: int, cron_str: str) -> int:
+            self.save()
+            return True
+
+    def update_notification(self, guild_id: int, game_id: int, is_opsec: int, channel_id: int, cron_str: str) -> int:
         """
         Update or add a new entry in the channels map
         :returns int - 1 if it's new 0 if it's an old entry
@@ -101,25 +185,26 @@ class Settings:
         game_id_str = str(game_id)
         is_opsec_str = str(is_opsec)
         channel_id_str = str(channel_id)
+        with self.locked():
+            is_new = 1
+            game_map = self.opsec_channels_map.get(game_id_str, None)
+            if game_map is None:
+                game_map = {}
 
-        is_new = 1
-        game_map = self.opsec_channels_map.get(game_id_str, None)
-        if game_map is None:
-            game_map = {}
-
-        opsec_map = game_map.get(is_opsec_str, None)
+            opsec_map = game_map.get(is_opsec_str, None)
 
-        if opsec_map is None:
-            opsec_map = {}
-            game_map[is_opsec_str] = opsec_map
+            if opsec_map is None:
+                opsec_map = {}
+                game_map[is_opsec_str] = opsec_map
 
-        channel = opsec_map.get(channel_id_str, None)
-        if channel is not None:
-            # since the channel exist we need to update this
-            is_new = 0
+            channel = opsec_map.get(channel_id_str, None)
+            if channel is not None:
+                # since the channel exist we need to update this
+                is_new = 0
 
-        game_map[is_opsec_str][channel_id_str] = cron_str
+            game_map[is_opsec_str][channel_id_str] = cron_str
 
-        self.opsec_channels_map[game_id_str] = game_map
-        self.save()
-        return is_new
+            self.opsec_channels_map[game_id_str] = game_map
+            self.channel_guilds[channel_id_str] = guild_id
+            self.save()
+            return is_new
@@ -0,0 +1,249 @@
+"""
+Replay a day of notifications against a recording Discord stub on virtual time.
+
+Subscriptions are loaded from the regular settings file and operations from a local JSON snapshot: a list of objects
+with the OperationRecord fields plus an optional `is_completed`. `date_start` and `date_end` are ISO 8601 local times,
+like the naive datetimes read from the Opserv tables.
+
+    python simulation.py operations.json --start 2026-10-19T00:00 --hours 24
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import selectors
+
+import discord
+from peewee import SqliteDatabase
+
+import database
+from clock import Clock
+from Cogs.operation_notification import Operation30Notifier, UpcomingOperationsNotifier
+from publisher import DiscordPublisher
+from settings import Settings
+from state import BotState
+
+
+class VirtualClock(Clock):
+    """Clock that only moves forward when the event loop has nothing left to do but wait"""
+    def __init__(self, start: datetime.datetime) -> None:
+        self.start = start
+        self.elapsed = 0.0
+
+    def now(self) -> datetime.datetime:
+        return self.start + datetime.timedelta(seconds=self.elapsed)
+
+    def minute(self) -> datetime.datetime:
+        return self.now().replace(second=0, microsecond=0)
+
+
+class VirtualSelector:
+    """Selector that never blocks. Waiting for the next timer moves the virtual clock forward instead"""
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.selector = selectors.DefaultSelector()
+
+    def select(self, timeout: float | None = None) -> list:
+        events = self.selector.select(0)
+        if not events and timeout:
+            self.clock.elapsed += timeout
+
+        return events
+
+    def __getattr__(self, name: str):
+        return getattr(self.selector, name)
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop running on the virtual clock, so `asyncio.sleep` in the notifiers returns immediately"""
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        super().__init__(VirtualSelector(clock))
+
+    def time(self) -> float:
+        return self.clock.elapsed
+
+
+class SimulationStats:
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.queries: collections.Counter = collections.Counter()
+        self.sends: collections.Counter = collections.Counter()
+        self.channel_fetches = 0
+        self.in_flight = 0
+        self.peak_concurrency = 0
+        self.peak_concurrency_at: datetime.datetime | None = None
+
+    def record_query(self) -> None:
+        self.queries[self.clock.minute()] += 1
+
+    def send_started(self) -> None:
+        self.sends[self.clock.minute()] += 1
+        self.in_flight += 1
+        if self.in_flight > self.peak_concurrency:
+            self.peak_concurrency = self.in_flight
+            self.peak_concurrency_at = self.clock.now()
+
+    def send_finished(self) -> None:
+        self.in_flight -= 1
+
+    def report(self, top: int = 10) -> str:
+        lines = ["Queries per minute:"]
+        lines.extend(f"  {minute:%Y-%m-%d %H:%M}  {count}" for minute, count in sorted(self.queries.items()))
+        lines.append(f"Total queries: {sum(self.queries.values())}")
+        lines.append(f"Channel fetches: {self.channel_fetches}")
+        lines.append(f"Total messages sent: {sum(self.sends.values())}")
+        lines.append(f"Largest send bursts (messages per minute, top {top}):")
+        lines.extend(f"  {minute:%Y-%m-%d %H:%M}  {count}" for minute, count in self.sends.most_common(top))
+        peak_at = f" at {self.peak_concurrency_at:%Y-%m-%d %H:%M:%S}" if self.peak_concurrency_at else ""
+        lines.append(f"Peak concurrent sends: {self.peak_concurrency}{peak_at}")
+        return "\n".join(lines)
+
+
+class RecordingChannel:
+    """Stand-in for a text channel that records messages instead of posting them"""
+    def __init__(self, channel_id: int, stats: SimulationStats, latency: float) -> None:
+        self.id = channel_id
+        self.stats = stats
+        self.latency = latency
+        self.messages: list[discord.Embed] = []
+
+    async def send(self, embed: discord.Embed) -> None:
+        self.stats.send_started()
+        try:
+            await asyncio.sleep(self.latency)
+            self.messages.append(embed)
+        finally:
+            self.stats.send_finished()
+
+
+class RecordingBot:
+    """The parts of commands.Bot the notifiers use"""
+    shard_count = None
+
+    def __init__(self, stats: SimulationStats, latency: float) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stats = stats
+        self.latency = latency
+        self.channels: {int: RecordingChannel} = {}
+
+    async def fetch_channel(self, channel_id: int) -> RecordingChannel:
+        self.stats.channel_fetches += 1
+        channel = self.channels.get(channel_id, None)
+        if channel is None:
+            channel = RecordingChannel(channel_id, self.stats, self.latency)
+            self.channels[channel_id] = channel
+
+        return channel
+
+    def get_partial_messageable(self, channel_id: int) -> RecordingChannel:
+        return self.channels[channel_id]
+
+
+class SnapshotOperations:
+    """Replaces the Opserv tables with the operations snapshot, while the notifiers keep their own time windows"""
+    def __init__(self, records: list[tuple[database.OperationRecord, bool]], stats: SimulationStats) -> None:
+        self.records = records
+        self.stats = stats
+
+    def select(self, game_id: int, is_opsec: bool, start: datetime.datetime, end: datetime.datetime | None = None,
+               exclude: list[int] | None = None) -> list[database.OperationRecord]:
+        self.stats.record_query()
+        exclude = exclude or []
+        operations = []
+        for record, is_completed in self.records:
+            # Same minute truncation as the Opserv query
+            date_start = record.date_start.replace(second=0, microsecond=0)
+            if str(record.game_id) != str(game_id) or int(record.is_opsec) != int(is_opsec) or is_completed:
+                continue
+
+            if date_start < start or (end is not None and date_start > end) or record.operation_id in exclude:
+                continue
+
+            operations.append(record)
+
+        return sorted(operations, key=lambda record: record.date_start)
+
+    @staticmethod
+    def load(filename: str, stats: SimulationStats) -> 'SnapshotOperations':
+        with open(filename, encoding='utf-8') as snapshot_file:
+            contents = json.load(snapshot_file)
+
+        records = []
+        for operation in contents:
+            fields = {name: operation[name] for name in database.OperationRecord.__slots__}
+            fields['date_start'] = datetime.datetime.fromisoformat(fields['date_start'])
+            fields['date_end'] = datetime.datetime.fromisoformat(fields['date_end'])
+            records.append((database.OperationRecord(**fields), bool(operation.get('is_completed', False))))
+
+        return SnapshotOperations(records, stats)
+
+
+async def simulate(snapshot: str, hours: float, latency: float) -> SimulationStats:
+    loop = asyncio.get_running_loop()
+    clock = loop.clock
+    logger = logging.getLogger("simulation")
+    stats = SimulationStats(clock)
+    bot = RecordingBot(stats, latency)
+    config = Settings()
+    operations = SnapshotOperations.load(snapshot, stats)
+
+    # Like the bot, both notifiers share the state and publisher, so channels are only resolved once
+    state = BotState()
+    publisher = DiscordPublisher(bot, config, state, logger)
+    notifier_30 = Operation30Notifier(bot, config, logger, clock, state, publisher, operations)
+    notifier_upcoming = UpcomingOperationsNotifier(bot, config, logger, clock, state, publisher, operations)
+    interval = notifier_30.send.hours * 3600 + notifier_30.send.minutes * 60 + notifier_30.send.seconds
+
+    async def poll_30() -> None:
+        # Mirrors the relative tasks.loop schedule, which runs on wall clock time and can't be used here
+        while True:
+            await notifier_30.send()
+            await asyncio.sleep(interval)
+
+    poll_task = loop.create_task(poll_30())
+    await asyncio.sleep(hours * 3600)
+    poll_task.cancel()
+    notifier_upcoming.stop()
+    results = await asyncio.gather(poll_task, *(task.task for task in notifier_upcoming.tasks.values()),
+                                   return_exceptions=True)
+    # Cancelled tasks are expected here, anything else means the notifiers broke during the run
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    return stats
+
+
+def run(snapshot: str, start: datetime.datetime, hours: float, latency: float) -> SimulationStats:
+    """Run the simulation on a virtual clock starting at `start`"""
+    loop = VirtualEventLoop(VirtualClock(start))
+    # The reminders and state saved during the simulation are kept in memory, away from the bot database
+    simulation_db = SqliteDatabase(':memory:')
+    models = [database.Notification30, database.BotSnapshot]
+    try:
+        with simulation_db.bind_ctx(models):
+            simulation_db.create_tables(models)
+            return loop.run_until_complete(simulate(snapshot, hours, latency))
+    finally:
+        loop.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay notifications on a virtual clock against a recording stub")
+    parser.add_argument("snapshot", help="JSON file with the operations to serve instead of Opserv")
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, default=None,
+                        help="Virtual start time, defaults to today at midnight")
+    parser.add_argument("--hours", type=float, default=24.0, help="Virtual hours to simulate")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds each message send takes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    start = args.start or datetime.datetime.combine(datetime.date.today(), datetime.time())
+    print(run(args.snapshot, start, args.hours, args.latency).report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import datetime
+import json
+
+import database
+import settings
+
+
+class BotState:
+    """
+    State the bot keeps across restarts: the channels it already resolved, the game catalog, the last upcoming
+    operations seen for each game/access pair and the last time each notification fired
+    """
+    CHANNELS = 'channels'
+    GAMES = 'games'
+    OPERATIONS = 'operations'
+    LAST_FIRED = 'last_fired'
+    # OperationRecord fields holding datetimes, stored as ISO 8601 strings
+    DATE_FIELDS = ('date_end', 'date_start')
+
+    channel_ids: set[int]
+    games: {int: str}
+    operations: {str: list[database.OperationRecord]}
+    last_fired: {str: datetime.datetime}
+
+    def __init__(self) -> None:
+        self.channel_ids = set()
+        self.games = {}
+        self.operations = {}
+        self.last_fired = {}
+
+    @staticmethod
+    def get_snapshot_key(name: str) -> str:
+        """
+        Returns the key a part of the state is stored under. Processes running a subset of the shards share the bot
+        database, so each keeps its own snapshot
+        """
+        if settings.SHARD_IDS is None:
+            return name
+
+        return f"{name}:{'-'.join(str(shard_id) for shard_id in settings.SHARD_IDS)}"
+
+    @staticmethod
+    def get_operations_key(game_id: int, is_opsec: int) -> str:
+        """Returns the key the operations snapshot is stored under"""
+        return f"{game_id}-{is_opsec}"
+
+    def set_operations(self, game_id: int, is_opsec: int, operations: list[database.OperationRecord]) -> None:
+        self.operations[self.get_operations_key(game_id, is_opsec)] = operations
+
+    def get_operations(self, game_id: int, is_opsec: int, since: datetime.datetime) -> list[database.OperationRecord]:
+        """Return the snapshot operations for the game/access pair that start after `since`"""
+        operations = self.operations.get(self.get_operations_key(game_id, is_opsec), [])
+        return [operation for operation in operations if operation.date_start >= since]
+
+    def refresh_games(self) -> None:
+        """Reload the game catalog from Opserv"""
+        game_model = database.Game
+        self.games = dict(game_model.select(game_model.game_id, game_model.game_name).tuples())
+
+    def dump_operation(self, operation: database.OperationRecord) -> list:
+        """Operations are stored as a list of their fields in slot order"""
+        row = []
+        for slot in database.OperationRecord.__slots__:
+            value = getattr(operation, slot)
+            if slot in self.DATE_FIELDS and value is not None:
+                value = value.isoformat()
+
+            row.append(value)
+
+        return row
+
+    def load_operation(self, row: list) -> database.OperationRecord:
+        fields = dict(zip(database.OperationRecord.__slots__, row))
+        for date_field in self.DATE_FIELDS:
+            if fields[date_field] is not None:
+                fields[date_field] = datetime.datetime.fromisoformat(fields[date_field])
+
+        return database.OperationRecord(**fields)
+
+    def load(self) -> None:
+        """Fill the state from the snapshot saved in the bot database"""
+        # Only this process' snapshot is read, under the plain part names
+        names = {
+            self.get_snapshot_key(name): name for name in (self.CHANNELS, self.GAMES, self.OPERATIONS, self.LAST_FIRED)
+        }
+        query = database.BotSnapshot.select().where(database.BotSnapshot.key.in_(list(names)))
+        snapshots = {names[row.key]: json.loads(row.payload) for row in query}
+
+        self.channel_ids = set(snapshots.get(self.CHANNELS, []))
+        # json turns our int keys into str, so they are converted back here
+        self.games = {int(game_id): name for game_id, name in snapshots.get(self.GAMES, {}).items()}
+        self.operations = {
+            key: [self.load_operation(row) for row in rows]
+            for key, rows in snapshots.get(self.OPERATIONS, {}).items()
+        }
+        self.last_fired = {
+            notification_id: datetime.datetime.fromisoformat(fired_at)
+            for notification_id, fired_at in snapshots.get(self.LAST_FIRED, {}).items()
+        }
+
+    def save(self, keys: tuple[str, ...] | None = None) -> None:
+        """
+        Write the state to the bot database, replacing the previous snapshot. When keys is given, only those parts
+        of the state are written
+        """
+        payloads = {
+            self.CHANNELS: sorted(self.channel_ids),
+            self.GAMES: self.games,
+            self.OPERATIONS: {
+                key: [self.dump_operation(operation) for operation in operations]
+                for key, operations in self.operations.items()
+            },
+            self.LAST_FIRED: {
+                notification_id: fired_at.isoformat() for notification_id, fired_at in self.last_fired.items()
+            },
+        }
+
+        now = datetime.datetime.now()
+        rows = [
+            {'key': self.get_snapshot_key(key), 'payload': json.dumps(payload), 'updated_at': now}
+            for key, payload in payloads.items() if keys is None or key in keys
+        ]
+        with database.bot.atomic():
+            database.BotSnapshot.replace_many(rows).execute()
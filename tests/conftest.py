@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+import pytest
+
+
+def pytest_configure(config):
+    # The bot modules read their settings from the environment and open the bot database and settings file relative
+    # to the working directory when imported, so both are set up before the test modules import them
+    os.environ.setdefault('DISCORD_BOT_TOKEN', 'test-token')
+    os.chdir(tempfile.mkdtemp(prefix="operations-bot-tests-"))
+
+
+@pytest.fixture(autouse=True)
+def clean_storage():
+    """Every test starts without settings file and with an empty bot database"""
+    import database
+    from settings import Settings
+
+    for filename in (Settings.SETTINGS_FILENAME, Settings.LOCK_FILENAME):
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    for model in (database.Notification30, database.BotSnapshot, database.CommandSync):
+        model.delete().execute()
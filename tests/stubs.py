@@ -0,0 +1,89 @@
+"""Stand-ins for the clock, Opserv and Discord shared by the tests"""
+import datetime
+import types
+
+import discord
+
+import database
+from clock import Clock
+
+
+class FixedClock(Clock):
+    """Clock the tests move by hand"""
+    def __init__(self, current: datetime.datetime) -> None:
+        self.current = current
+
+    def now(self) -> datetime.datetime:
+        return self.current
+
+
+class StubOperations:
+    """Serves a list of operations with the same filters as the Opserv query"""
+    def __init__(self, operations: list[database.OperationRecord]) -> None:
+        self.operations = operations
+        self.queries = 0
+
+    def select(self, game_id: int, is_opsec: bool, start: datetime.datetime, end: datetime.datetime | None = None,
+               exclude: list[int] | None = None) -> list[database.OperationRecord]:
+        self.queries += 1
+        exclude = exclude or []
+        return [
+            operation for operation in self.operations
+            if str(operation.game_id) == str(game_id) and int(operation.is_opsec) == int(is_opsec)
+            and start <= operation.date_start.replace(second=0) and (end is None or operation.date_start <= end)
+            and operation.operation_id not in exclude
+        ]
+
+
+class StubPublisher:
+    """Records the payloads instead of posting them, reaching every channel unless told otherwise"""
+    def __init__(self, error: Exception | None = None) -> None:
+        self.payloads = []
+        self.error = error
+
+    async def publish(self, payload) -> list[int]:
+        self.payloads.append(payload)
+        if self.error is not None:
+            raise self.error
+
+        return payload.channel_ids
+
+
+class StubChannel:
+    """Text channel recording the embeds posted to it, or failing every post with the given error"""
+    def __init__(self, channel_id: int, error: Exception | None = None) -> None:
+        self.id = channel_id
+        self.error = error
+        self.embeds = []
+
+    async def send(self, embed) -> None:
+        if self.error is not None:
+            raise self.error
+
+        self.embeds.append(embed)
+
+
+class StubBot:
+    """The parts of the bot a DiscordPublisher uses"""
+    shard_count = None
+
+    def __init__(self, channels: list[StubChannel]) -> None:
+        self.channels = {channel.id: channel for channel in channels}
+
+    async def fetch_channel(self, channel_id: int) -> StubChannel:
+        return self.channels[channel_id]
+
+    def get_partial_messageable(self, channel_id: int) -> StubChannel:
+        return self.channels[channel_id]
+
+
+def make_http_error(status: int, error_type: type[discord.HTTPException] = discord.HTTPException) -> Exception:
+    """Build a discord.py HTTP error without a real response"""
+    return error_type(types.SimpleNamespace(status=status, reason="Error"), "failed")
+
+
+def make_operation(operation_id: int, date_start: datetime.datetime, game_id: int = 1,
+                   is_opsec: bool = False) -> database.OperationRecord:
+    return database.OperationRecord(operation_id, f"Operation {operation_id}", date_start,
+                                    date_start + datetime.timedelta(hours=2), game_id, is_opsec, "Game",
+                                    "Leader")
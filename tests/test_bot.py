@@ -0,0 +1,105 @@
+import asyncio
+import os
+import signal
+
+import discord
+from discord import app_commands
+
+import bot
+import database
+import settings
+from state import BotState
+
+
+def sync_commands(monkeypatch, commands: list[app_commands.Command] | None = None, times: int = 1) -> list:
+    """Run sync_commands on a new bot the given number of times, returning the guilds synced to Discord"""
+    synced = []
+
+    async def run() -> None:
+        discord_bot = bot.DiscordBot()
+
+        async def sync(guild: discord.abc.Snowflake | None = None) -> list:
+            synced.append(guild.id if guild is not None else None)
+            return []
+
+        monkeypatch.setattr(discord_bot.tree, 'sync', sync)
+        for command in commands or []:
+            discord_bot.tree.add_command(command)
+
+        for _ in range(times):
+            await discord_bot.sync_commands()
+
+    asyncio.run(run())
+    return synced
+
+
+@app_commands.command(name="ping", description="Check the bot is up")
+async def ping(interaction: discord.Interaction) -> None:
+    await interaction.response.send_message("pong")
+
+
+def test_commands_are_synced_again_only_when_they_change(monkeypatch):
+    monkeypatch.setattr(settings, 'GUILD_IDS', [])
+
+    assert sync_commands(monkeypatch, times=2) == [None]
+    # A restart with the same commands doesn't sync
+    assert sync_commands(monkeypatch) == []
+    assert sync_commands(monkeypatch, [ping]) == [None]
+
+
+def test_commands_are_only_synced_to_owned_guilds(monkeypatch):
+    shard_0_guild = 2 << 22
+    shard_1_guild = 3 << 22
+    monkeypatch.setattr(settings, 'GUILD_IDS', [shard_0_guild, shard_1_guild])
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 2)
+    monkeypatch.setattr(settings, 'SHARD_IDS', [1])
+
+    assert sync_commands(monkeypatch) == [shard_1_guild]
+    assert [row.guild_id for row in database.CommandSync.select()] == [shard_1_guild]
+
+
+def test_sigterm_closes_the_bot_and_saves_the_state():
+    async def run() -> None:
+        discord_bot = bot.DiscordBot()
+        discord_bot.state.channel_ids = {100}
+        async with discord_bot:
+            discord_bot.register_signal_handlers()
+            os.kill(os.getpid(), signal.SIGTERM)
+            # The signal is handled on the next iterations of the event loop
+            while discord_bot.close_task is None:
+                await asyncio.sleep(0.01)
+
+            await asyncio.wait_for(discord_bot.close_task, 5)
+
+        assert discord_bot.is_closed()
+
+    asyncio.run(run())
+
+    saved = BotState()
+    saved.load()
+    assert saved.channel_ids == {100}
+
+
+def test_close_saves_the_state_when_the_consumer_failed():
+    class StoppedWorker:
+        async def stop(self) -> None:
+            pass
+
+    async def fail() -> None:
+        raise RuntimeError("consumer failed")
+
+    async def run() -> None:
+        discord_bot = bot.DiscordBot()
+        discord_bot.worker = StoppedWorker()
+        discord_bot.state.channel_ids = {100}
+        discord_bot.consumer_task = asyncio.create_task(fail())
+        async with discord_bot:
+            await discord_bot.close()
+
+        assert discord_bot.is_closed()
+
+    asyncio.run(run())
+
+    saved = BotState()
+    saved.load()
+    assert saved.channel_ids == {100}
@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import logging
+
+from stubs import FixedClock, StubOperations, StubPublisher, make_operation
+
+import settings
+from Cogs.operation_notification import (
+    NOTIFICATION_OPTIONS,
+    Operation30Notifier,
+    OperationsEmbed,
+    UpcomingOperationsNotifier,
+)
+from settings import Settings
+from state import BotState
+
+logger = logging.getLogger("tests")
+
+
+def make_config(cron: str = "0 * * * *") -> Settings:
+    config = Settings()
+    config.update_notification(1, 1, 0, 100, cron)
+    return config
+
+
+def test_30_minute_reminder_is_not_repeated_after_a_restart():
+    operations = StubOperations([make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))])
+    config = make_config()
+
+    async def send_at(now: datetime.datetime) -> StubPublisher:
+        # Each run stands for a new bot process, sharing only the bot database
+        publisher = StubPublisher()
+        notifier = Operation30Notifier(None, config, logger, FixedClock(now), BotState(), publisher, operations)
+        await notifier.send()
+        return publisher
+
+    assert len(asyncio.run(send_at(datetime.datetime(2026, 10, 19, 9, 33, 20))).payloads) == 1
+    # Still in the 30 minute window, but already reminded
+    assert asyncio.run(send_at(datetime.datetime(2026, 10, 19, 9, 36))).payloads == []
+    # The operation started, there is nothing to remind anymore
+    assert asyncio.run(send_at(datetime.datetime(2026, 10, 19, 10, 1, 5))).payloads == []
+
+
+def test_30_minute_reminder_is_sent_by_each_shard_process(monkeypatch):
+    # Guild ids are routed to shard (guild_id >> 22) % SHARD_COUNT
+    config = Settings()
+    config.update_notification(2 << 22, 1, 0, 100, "0 * * * *")
+    config.update_notification(3 << 22, 1, 0, 200, "0 * * * *")
+    operations = StubOperations([make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))])
+    clock = FixedClock(datetime.datetime(2026, 10, 19, 9, 33))
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 2)
+
+    async def send_from_shard(shard_id: int) -> StubPublisher:
+        # Both processes share the bot database
+        monkeypatch.setattr(settings, 'SHARD_IDS', [shard_id])
+        publisher = StubPublisher()
+        notifier = Operation30Notifier(None, config, logger, clock, BotState(), publisher, operations)
+        await notifier.send()
+        return publisher
+
+    assert [payload.channel_ids for payload in asyncio.run(send_from_shard(0)).payloads] == [[100]]
+    assert [payload.channel_ids for payload in asyncio.run(send_from_shard(1)).payloads] == [[200]]
+    assert asyncio.run(send_from_shard(0)).payloads == []
+
+
+class NoChannelPublisher(StubPublisher):
+    """Publisher whose messages reach none of the channels"""
+    async def publish(self, payload) -> list[int]:
+        self.payloads.append(payload)
+        return []
+
+
+def test_30_minute_reminder_is_retried_when_not_delivered():
+    operations = StubOperations([make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))])
+    config = make_config()
+    clock = FixedClock(datetime.datetime(2026, 10, 19, 9, 33))
+
+    async def send(publisher: StubPublisher) -> None:
+        notifier = Operation30Notifier(None, config, logger, clock, BotState(), publisher, operations)
+        await notifier.send()
+
+    asyncio.run(send(NoChannelPublisher()))
+    publisher = StubPublisher()
+    asyncio.run(send(publisher))
+    assert len(publisher.payloads) == 1
+
+
+def test_catch_up_sends_missed_notifications_from_the_snapshot():
+    now = datetime.datetime(2026, 10, 19, 10, 30)
+    config = Settings()
+    config.update_notification(1, 1, 0, 100, "0 * * * *")
+    config.update_notification(1, 1, 0, 200, "0 * * * *")
+    state = BotState()
+    # Channel 100 missed the 09:00 and 10:00 runs, channel 200 already got the 10:00 one
+    state.last_fired = {
+        "1-0-100": datetime.datetime(2026, 10, 19, 8, 0),
+        "1-0-200": datetime.datetime(2026, 10, 19, 10, 0),
+    }
+    state.set_operations(1, '0', [make_operation(10, datetime.datetime(2026, 10, 19, 9, 0)),
+                                  make_operation(11, datetime.datetime(2026, 10, 19, 11, 0))])
+    operations = StubOperations([])
+    publisher = StubPublisher()
+
+    async def catch_up() -> None:
+        notifier = UpcomingOperationsNotifier(None, config, logger, FixedClock(now), state, publisher, operations)
+        try:
+            await notifier.catch_up()
+        finally:
+            notifier.stop()
+
+    asyncio.run(catch_up())
+
+    # A single message for the missed runs, with the operations still upcoming, and without querying Opserv
+    assert [payload.channel_ids for payload in publisher.payloads] == [[100]]
+    assert [field['name'] for field in publisher.payloads[0].embed['fields']] == ["Operation 11"]
+    assert operations.queries == 0
+    assert state.last_fired["1-0-100"] == now
+    # Saved right away, not only with the next snapshot
+    saved = BotState()
+    saved.load()
+    assert saved.last_fired["1-0-100"] == now
+
+
+def test_30_minute_reminder_is_retried_only_for_channels_not_reached():
+    operations = StubOperations([make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))])
+    config = make_config()
+    config.update_notification(1, 1, 0, 200, "0 * * * *")
+    clock = FixedClock(datetime.datetime(2026, 10, 19, 9, 33))
+
+    class FirstChannelPublisher(StubPublisher):
+        async def publish(self, payload) -> list[int]:
+            self.payloads.append(payload)
+            return payload.channel_ids[:1]
+
+    async def send(publisher: StubPublisher) -> StubPublisher:
+        notifier = Operation30Notifier(None, config, logger, clock, BotState(), publisher, operations)
+        await notifier.send()
+        return publisher
+
+    assert [payload.channel_ids for payload in asyncio.run(send(FirstChannelPublisher())).payloads] == [[100, 200]]
+    assert [payload.channel_ids for payload in asyncio.run(send(StubPublisher())).payloads] == [[200]]
+
+
+def test_embed_dates_are_read_in_the_opserv_timezone():
+    # 10:00 in Opserv, UTC-5, is 15:00 UTC
+    operation = make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))
+    timestamp = int(datetime.datetime(2026, 10, 19, 15, 0, tzinfo=datetime.UTC).timestamp())
+    embed = OperationsEmbed("Operations", NOTIFICATION_OPTIONS['UPCOMING_OPS']).render([operation])
+
+    assert f"**Start:** <t:{timestamp}>" in embed.fields[0].value
+    assert f"**End:** <t:{timestamp + 7200}>" in embed.fields[0].value
+
+
+def test_catch_up_keeps_operations_starting_on_the_hour():
+    now = datetime.datetime(2026, 10, 19, 10, 30, 15, 250000)
+    config = make_config()
+    state = BotState()
+    state.last_fired = {"1-0-100": datetime.datetime(2026, 10, 19, 9, 0)}
+    state.set_operations(1, '0', [make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))])
+    publisher = StubPublisher()
+
+    async def catch_up() -> None:
+        notifier = UpcomingOperationsNotifier(None, config, logger, FixedClock(now), state, publisher,
+                                              StubOperations([]))
+        try:
+            await notifier.catch_up()
+        finally:
+            notifier.stop()
+
+    asyncio.run(catch_up())
+
+    assert [field['name'] for field in publisher.payloads[0].embed['fields']] == ["Operation 10"]
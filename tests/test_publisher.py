@@ -0,0 +1,29 @@
+import asyncio
+import logging
+import queue
+
+from publisher import OperationsPayload, PayloadAck, QueuePublisher
+
+logger = logging.getLogger("tests")
+
+
+def test_queue_publisher_returns_the_acknowledged_channels():
+    async def run() -> list[int]:
+        publisher = QueuePublisher(queue.Queue(), logger)
+        publish = asyncio.create_task(publisher.publish(OperationsPayload([100, 200], {})))
+        await asyncio.sleep(0)
+        payload = publisher.payloads.get_nowait()
+        publisher.acknowledge(PayloadAck(payload.payload_id, [200]))
+        return await publish
+
+    assert asyncio.run(run()) == [200]
+
+
+def test_queue_publisher_gives_up_on_payloads_never_acknowledged(monkeypatch):
+    monkeypatch.setattr(QueuePublisher, 'ACK_TIMEOUT', 0.01)
+
+    async def run() -> tuple[list[int], dict]:
+        publisher = QueuePublisher(queue.Queue(), logger)
+        return await publisher.publish(OperationsPayload([100], {})), publisher.pending
+
+    assert asyncio.run(run()) == ([], {})
@@ -0,0 +1,37 @@
+import settings
+from settings import Settings
+
+
+def test_changes_from_other_processes_are_merged():
+    first = Settings()
+    second = Settings()
+    first.update_notification(1, 10, 0, 100, "0 * * * *")
+    second.update_notification(2, 20, 1, 200, "30 * * * *")
+
+    merged = Settings()
+    assert merged.opsec_channels_map == {'10': {'0': {'100': "0 * * * *"}}, '20': {'1': {'200': "30 * * * *"}}}
+    assert merged.channel_guilds == {'100': 1, '200': 2}
+
+    assert first.remove_notification(20, 1, 200)
+    assert Settings().opsec_channels_map == {'10': {'0': {'100': "0 * * * *"}}, '20': {'1': {}}}
+    assert Settings().channel_guilds == {'100': 1}
+
+
+def test_owned_channels_map_keeps_the_channels_of_owned_shards(monkeypatch):
+    # Guild ids are routed to shard (guild_id >> 22) % SHARD_COUNT
+    shard_0_guild = 2 << 22
+    shard_1_guild = 3 << 22
+    config = Settings()
+    config.update_notification(shard_0_guild, 10, 0, 100, "0 * * * *")
+    config.update_notification(shard_1_guild, 10, 0, 200, "0 * * * *")
+    config.update_notification(shard_1_guild, 20, 1, 300, "0 * * * *")
+
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 2)
+    monkeypatch.setattr(settings, 'SHARD_IDS', [0])
+    assert config.get_owned_channels_map() == {'10': {'0': {'100': "0 * * * *"}}}
+
+    monkeypatch.setattr(settings, 'SHARD_IDS', [1])
+    assert config.get_owned_channels_map() == {'10': {'0': {'200': "0 * * * *"}}, '20': {'1': {'300': "0 * * * *"}}}
+
+    monkeypatch.setattr(settings, 'SHARD_IDS', None)
+    assert config.get_owned_channels_map() == config.opsec_channels_map
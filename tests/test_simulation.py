@@ -0,0 +1,42 @@
+import datetime
+import json
+
+import simulation
+from settings import Settings
+
+
+def test_simulation_reports_queries_sends_and_peak(tmp_path):
+    config = Settings()
+    config.update_notification(1, 1, 0, 100, "0 * * * *")
+    config.update_notification(1, 1, 0, 101, "0 * * * *")
+    config.update_notification(1, 1, 1, 200, "30 * * * *")
+    snapshot = tmp_path / "operations.json"
+    snapshot.write_text(json.dumps([
+        {'operation_id': 10, 'operation_name': "Public op", 'date_start': "2026-10-19T01:00:00",
+         'date_end': "2026-10-19T03:00:00", 'game_id': 1, 'is_opsec': False, 'game_name': "Game",
+         'leader_username': "Leader"},
+        {'operation_id': 11, 'operation_name': "OPSEC op", 'date_start': "2026-10-19T01:30:00",
+         'date_end': "2026-10-19T03:00:00", 'game_id': 1, 'is_opsec': True, 'game_name': "Game",
+         'leader_username': "Leader"},
+        {'operation_id': 12, 'operation_name': "Completed op", 'date_start': "2026-10-19T01:00:00",
+         'date_end': "2026-10-19T03:00:00", 'game_id': 1, 'is_opsec': False, 'game_name': "Game",
+         'leader_username': "Leader", 'is_completed': True},
+    ]))
+
+    # Until 01:42:36, away from any scheduled run
+    stats = simulation.run(str(snapshot), datetime.datetime(2026, 10, 19), 1.71, 0.3)
+
+    # 35 runs of the 30 minute reminder over both game/access pairs, and 4 upcoming notifications
+    assert sum(stats.queries.values()) == 35 * 2 + 4
+    # Reminders: the public op to both channels at 00:30, the OPSEC op at 01:00. Upcoming: OPSEC at 00:30 and
+    # 01:30, public to both channels at 01:00
+    assert stats.sends == {
+        datetime.datetime(2026, 10, 19, 0, 30): 3,
+        datetime.datetime(2026, 10, 19, 1, 0): 3,
+        datetime.datetime(2026, 10, 19, 1, 30): 1,
+    }
+    # Each channel is only fetched once, the state is shared by the notifiers
+    assert stats.channel_fetches == 3
+    # At 00:30 the reminder posts to its channels one after the other, while the OPSEC notification posts alongside
+    assert stats.peak_concurrency == 2
+    assert stats.peak_concurrency_at == datetime.datetime(2026, 10, 19, 0, 30)
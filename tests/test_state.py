@@ -0,0 +1,58 @@
+import datetime
+
+from stubs import make_operation
+
+import settings
+from state import BotState
+
+
+def test_save_and_load_keep_datetimes():
+    state = BotState()
+    state.channel_ids = {100, 200}
+    state.games = {1: "Arma 3"}
+    start = datetime.datetime(2026, 10, 19, 20, 0)
+    state.set_operations(1, 0, [make_operation(10, start)])
+    state.last_fired = {"1-0-100": datetime.datetime(2026, 10, 19, 18, 0)}
+    state.save()
+
+    loaded = BotState()
+    loaded.load()
+    assert loaded.channel_ids == {100, 200}
+    assert loaded.games == {1: "Arma 3"}
+    assert loaded.last_fired == {"1-0-100": datetime.datetime(2026, 10, 19, 18, 0)}
+    operation = loaded.operations["1-0"][0]
+    assert operation.operation_id == 10
+    assert operation.date_start == start
+    assert operation.date_end == start + datetime.timedelta(hours=2)
+    assert loaded.get_operations(1, 0, start) == [operation]
+    assert loaded.get_operations(1, 0, start + datetime.timedelta(minutes=1)) == []
+
+
+def test_save_only_the_given_keys():
+    state = BotState()
+    state.channel_ids = {100}
+    state.games = {1: "Arma 3"}
+    state.save((BotState.CHANNELS,))
+
+    loaded = BotState()
+    loaded.load()
+    assert loaded.channel_ids == {100}
+    assert loaded.games == {}
+
+
+def test_shard_processes_keep_their_own_snapshot(monkeypatch):
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 2)
+    monkeypatch.setattr(settings, 'SHARD_IDS', [0])
+    first = BotState()
+    first.channel_ids = {100}
+    first.save()
+
+    monkeypatch.setattr(settings, 'SHARD_IDS', [1])
+    second = BotState()
+    second.channel_ids = {200}
+    second.save()
+
+    monkeypatch.setattr(settings, 'SHARD_IDS', [0])
+    loaded = BotState()
+    loaded.load()
+    assert loaded.channel_ids == {100}
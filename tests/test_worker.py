@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import logging
+
+import discord
+import pytest
+from stubs import (
+    FixedClock,
+    StubBot,
+    StubChannel,
+    StubOperations,
+    StubPublisher,
+    make_http_error,
+    make_operation,
+)
+
+import database
+import worker
+from publisher import DiscordPublisher
+from settings import Settings
+from state import BotState
+
+logger = logging.getLogger("tests")
+
+
+@pytest.fixture(autouse=True)
+def fast_worker(monkeypatch):
+    monkeypatch.setattr(worker, 'POLL_TIMEOUT', 0.05)
+    monkeypatch.setattr(worker, 'RESTART_DELAY', 0)
+    # The game catalog comes from Opserv, which the tests don't have
+    monkeypatch.setattr(BotState, 'refresh_games', lambda state: None)
+
+
+async def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+class PublisherSpy:
+    """Records the payloads handed to another publisher"""
+    def __init__(self, publisher: StubPublisher | DiscordPublisher) -> None:
+        self.publisher = publisher
+        self.payloads = []
+
+    async def publish(self, payload) -> list[int]:
+        self.payloads.append(payload)
+        return await self.publisher.publish(payload)
+
+
+def run_first_reminder(publisher: StubPublisher | DiscordPublisher, channel_ids: tuple[int, ...] = (100,)) -> None:
+    """Run a local worker until its first 30 minute reminder run is over, posting with the given publisher"""
+    config = Settings()
+    for channel_id in channel_ids:
+        # Yearly upcoming notification, so that only the 30 minute reminder posts during the test
+        config.update_notification(1, 1, 0, channel_id, "0 0 1 1 *")
+
+    clock = FixedClock(datetime.datetime(2026, 10, 19, 9, 33))
+    operations = StubOperations([make_operation(10, datetime.datetime(2026, 10, 19, 10, 0))])
+
+    async def run() -> None:
+        local_worker = worker.LocalWorker(logger, clock, operations)
+        local_worker.start()
+        spy = PublisherSpy(publisher)
+        consumer = asyncio.create_task(worker.consume_payloads(local_worker, spy, BotState(), logger))
+        await wait_for(lambda: spy.payloads)
+        # The reminder run goes on once the payload is acknowledged
+        await wait_for(lambda: not local_worker.worker.notifier_30.publisher.pending)
+        assert not consumer.done()
+        await local_worker.stop()
+        await consumer
+
+    asyncio.run(run())
+
+
+def test_local_worker_records_delivered_reminders():
+    publisher = StubPublisher()
+    run_first_reminder(publisher)
+
+    assert [payload.channel_ids for payload in publisher.payloads] == [[100]]
+    assert [row.operation_id for row in database.Notification30.select()] == [10]
+
+
+@pytest.mark.parametrize('error', [make_http_error(500), TimeoutError(), OSError("Connection reset")])
+def test_local_worker_does_not_record_failed_reminders(error):
+    publisher = StubPublisher(error=error)
+    run_first_reminder(publisher)
+
+    assert len(publisher.payloads) == 1
+    assert database.Notification30.select().count() == 0
+
+
+def test_local_worker_records_reminders_reaching_some_channels():
+    reached = StubChannel(100)
+    forbidden = StubChannel(200, make_http_error(403, discord.Forbidden))
+    bot = StubBot([reached, forbidden])
+    publisher = DiscordPublisher(bot, Settings(), BotState(), logger)
+    run_first_reminder(publisher, (100, 200))
+
+    assert len(reached.embeds) == 1
+    assert [row.operation_id for row in database.Notification30.select()] == [10]
+
+
+def test_dead_worker_is_restarted():
+    async def run() -> None:
+        local_worker = worker.LocalWorker(logger, operations=StubOperations([]))
+        local_worker.start()
+        consumer = asyncio.create_task(worker.consume_payloads(local_worker, StubPublisher(), BotState(), logger))
+        first_task = local_worker.task
+        first_task.cancel()
+
+        await wait_for(lambda: local_worker.task is not first_task and local_worker.is_alive())
+        await local_worker.stop()
+        await consumer
+        assert not local_worker.is_alive()
+
+    asyncio.run(run())
+
+
+def test_bot_state_gets_the_game_catalog_refreshed_by_the_worker(monkeypatch):
+    def refresh_games(state: BotState) -> None:
+        state.games = {1: "Arma 3"}
+
+    monkeypatch.setattr(BotState, 'refresh_games', refresh_games)
+    bot_state = BotState()
+    publisher = DiscordPublisher(StubBot([]), Settings(), bot_state, logger)
+
+    async def run() -> None:
+        local_worker = worker.LocalWorker(logger, operations=StubOperations([]))
+        local_worker.start()
+        consumer = asyncio.create_task(worker.consume_payloads(local_worker, publisher, bot_state, logger))
+        await wait_for(lambda: bot_state.games)
+        await local_worker.stop()
+        await consumer
+
+    asyncio.run(run())
+
+    assert bot_state.games == {1: "Arma 3"}
@@ -0,0 +1,295 @@
+"""
+Runs the Opserv queries, the 30 minute reminder bookkeeping and the embed rendering away from the gateway.
+
+The worker owns both notifiers and hands the rendered payloads to the bot over a queue, the bot posts them with a
+DiscordPublisher and answers each one with a PayloadAck listing the channels it reached, so 30 minute reminders are
+only recorded once delivered. The refreshed game catalog goes to the bot the same way, as a GamesCatalog.
+Notification changes made through the slash commands go the other way as NotificationChange messages. `None` on the
+payloads or changes queue tells the other side to stop. Queues are polled, so no executor thread stays blocked on a
+read, and the bot restarts the worker when it dies.
+"""
+import asyncio
+import multiprocessing
+import queue
+from logging import Logger
+
+from discord.ext import tasks
+
+import database
+from clock import Clock
+from Cogs.operation_notification import Operation30Notifier, UpcomingOperationsNotifier
+from publisher import DiscordPublisher, PayloadAck, QueuePublisher
+from settings import Settings
+from state import BotState
+
+# Seconds a queue read waits before the reader checks whether it should stop
+POLL_TIMEOUT = 1.0
+# Seconds to wait before restarting a worker that died, so a worker failing on start doesn't restart in a loop
+RESTART_DELAY = 5.0
+# Seconds a stopping worker process gets to save its state before it's terminated
+STOP_TIMEOUT = 30.0
+
+
+async def poll_queue(source: queue.Queue):
+    """
+    Wait for the next message in an executor thread
+    :raises queue.Empty when nothing came within POLL_TIMEOUT
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, source.get, True, POLL_TIMEOUT)
+
+
+class NotificationChange:
+    """A notification added, updated or removed (cron is None) through the slash commands"""
+    __slots__ = ('channel_id', 'cron', 'game_id', 'is_opsec')
+
+    def __init__(self, game_id: int, is_opsec: int, channel_id: int, cron: str | None = None) -> None:
+        self.game_id = game_id
+        self.is_opsec = is_opsec
+        self.channel_id = channel_id
+        self.cron = cron
+
+
+class GamesCatalog:
+    """The game catalog the worker refreshed from Opserv, for the slash commands of the bot process"""
+    __slots__ = ('games',)
+
+    def __init__(self, games: {int: str}) -> None:
+        self.games = games
+
+
+class Worker:
+    # State keys the worker is responsible for, the bot process saves the rest
+    STATE_KEYS = (BotState.GAMES, BotState.OPERATIONS, BotState.LAST_FIRED)
+
+    notifier_30: Operation30Notifier
+    notifier_upcoming: UpcomingOperationsNotifier
+
+    def __init__(self, payloads: queue.Queue, changes: queue.Queue, acks: queue.Queue, logger: Logger,
+                 clock: Clock | None = None, operations: database.OpservOperations | None = None) -> None:
+        self.payloads = payloads
+        self.changes = changes
+        self.acks = acks
+        self.logger = logger
+        self.clock = clock
+        self.operations = operations
+        self.config = Settings()
+        self.state = BotState()
+
+    @tasks.loop(minutes=5.0)
+    async def snapshot_task(self) -> None:
+        self.state.save(self.STATE_KEYS)
+
+    async def warm_start(self) -> None:
+        """Send what was missed while offline from the saved state, then refresh the state from Opserv"""
+        try:
+            await self.notifier_upcoming.catch_up()
+            self.state.refresh_games()
+            self.payloads.put(GamesCatalog(self.state.games))
+            self.notifier_upcoming.refresh_operations()
+            self.state.save(self.STATE_KEYS)
+        except Exception:
+            self.logger.exception("Warm start failed, notifications will refresh on their next run")
+
+    def apply_change(self, change: NotificationChange) -> None:
+        # The bot process already saved the change to the settings file
+        self.config.load()
+        if change.cron is None:
+            self.notifier_upcoming.stop_task(change.game_id, change.is_opsec, change.channel_id)
+        else:
+            self.notifier_upcoming.update_task(change.game_id, change.is_opsec, change.channel_id, change.cron)
+
+    async def receive_acks(self, publisher: QueuePublisher) -> None:
+        while True:
+            try:
+                ack = await poll_queue(self.acks)
+            except queue.Empty:
+                continue
+
+            publisher.acknowledge(ack)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.state.load()
+        publisher = QueuePublisher(self.payloads, self.logger)
+        self.notifier_30 = Operation30Notifier(None, self.config, self.logger, self.clock, self.state, publisher,
+                                               self.operations)
+        self.notifier_upcoming = UpcomingOperationsNotifier(None, self.config, self.logger, self.clock, self.state,
+                                                            publisher, self.operations)
+        self.notifier_30.send.start()
+        self.snapshot_task.start()
+        warm_start_task = loop.create_task(self.warm_start())
+        acks_task = loop.create_task(self.receive_acks(publisher))
+
+        try:
+            while True:
+                try:
+                    change = await poll_queue(self.changes)
+                except queue.Empty:
+                    continue
+
+                if change is None:
+                    break
+
+                self.apply_change(change)
+        finally:
+            warm_start_task.cancel()
+            acks_task.cancel()
+            self.snapshot_task.cancel()
+            self.notifier_30.send.cancel()
+            self.notifier_upcoming.stop()
+            self.state.save(self.STATE_KEYS)
+            self.payloads.put(None)
+
+
+async def consume_payloads(worker: 'WorkerProcess | LocalWorker', publisher: DiscordPublisher, state: BotState,
+                           logger: Logger) -> None:
+    """
+    Post the payloads coming from the worker until it stops, acknowledging each with the channels it reached, and
+    keep the game catalog of the bot state up to date. A worker that dies without being asked to stop is restarted
+    """
+    while True:
+        try:
+            payload = await poll_queue(worker.payloads)
+        except queue.Empty:
+            if worker.is_alive():
+                continue
+
+            payload = None
+
+        if isinstance(payload, GamesCatalog):
+            state.games = payload.games
+            continue
+
+        if payload is None:
+            if worker.stopping:
+                return
+
+            logger.error("The worker stopped unexpectedly, restarting it in %s seconds", RESTART_DELAY)
+            await asyncio.sleep(RESTART_DELAY)
+            if worker.stopping:
+                return
+
+            await worker.restart()
+            continue
+
+        try:
+            sent = await publisher.publish(payload)
+        except Exception:
+            # Any error, also from the connection, must still be acknowledged so the worker doesn't wait on it
+            logger.exception("Failed to post payload %s", payload.payload_id)
+            sent = []
+
+        worker.acks.put(PayloadAck(payload.payload_id, sent))
+
+
+def main(payloads: multiprocessing.Queue, changes: multiprocessing.Queue, acks: multiprocessing.Queue) -> None:
+    """Entry point of the worker process"""
+    # bot_logger opens the log file when imported, so only the worker process imports it from this module
+    import bot_logger
+
+    asyncio.run(Worker(payloads, changes, acks, bot_logger.logger.getChild("worker")).run())
+
+
+class WorkerProcess:
+    """Worker running in its own process, so queries and rendering don't share the GIL with the gateway"""
+    payloads: multiprocessing.Queue
+    changes: multiprocessing.Queue
+    acks: multiprocessing.Queue
+    process: multiprocessing.Process
+
+    def __init__(self, logger: Logger) -> None:
+        self.logger = logger
+        self.context = multiprocessing.get_context('spawn')
+        self.stopping = False
+        self.create_process()
+
+    def create_process(self) -> None:
+        # A process that died may have left its queues mid-message, so each process gets new ones
+        self.payloads = self.context.Queue()
+        self.changes = self.context.Queue()
+        self.acks = self.context.Queue()
+        self.process = self.context.Process(target=main, args=(self.payloads, self.changes, self.acks),
+                                            name="operations-worker", daemon=True)
+
+    def start(self) -> None:
+        self.process.start()
+        self.logger.info("Started worker process %s", self.process.pid)
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    async def join(self) -> None:
+        """Wait for the process to exit, terminating it when it doesn't within STOP_TIMEOUT"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.process.join, STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.logger.error("Worker process %s didn't stop, terminating it", self.process.pid)
+            self.process.terminate()
+            await loop.run_in_executor(None, self.process.join)
+
+    async def restart(self) -> None:
+        await self.join()
+        self.logger.error("Worker process %s exited with code %s", self.process.pid, self.process.exitcode)
+        self.create_process()
+        self.start()
+
+    async def stop(self) -> None:
+        self.stopping = True
+        self.changes.put(None)
+        await self.join()
+
+
+class LocalWorker:
+    """Worker running as a task of the current event loop with in-memory queues. Meant for tests"""
+    task: asyncio.Task = None
+    worker: Worker
+
+    def __init__(self, logger: Logger, clock: Clock | None = None,
+                 operations: database.OpservOperations | None = None) -> None:
+        self.logger = logger
+        self.clock = clock
+        self.operations = operations
+        self.stopping = False
+        self.create_worker()
+
+    def create_worker(self) -> None:
+        self.payloads = queue.Queue()
+        self.changes = queue.Queue()
+        self.acks = queue.Queue()
+        self.worker = Worker(self.payloads, self.changes, self.acks, self.logger, self.clock, self.operations)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.worker.run())
+
+    def is_alive(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def join(self) -> None:
+        await asyncio.wait([self.task])
+        if not self.task.cancelled() and self.task.exception() is not None:
+            self.logger.error("Worker task failed", exc_info=self.task.exception())
+
+    async def restart(self) -> None:
+        self.task.cancel()
+        await self.join()
+        self.create_worker()
+        self.start()
+
+    async def stop(self) -> None:
+        self.stopping = True
+        self.changes.put(None)
+        await self.join()
+
+
+def create_worker(mode: str, logger: Logger) -> WorkerProcess | LocalWorker | None:
+    """Returns the worker for the given WORKER_MODE, None when the notifiers run in the bot itself"""
+    if mode == 'process':
+        return WorkerProcess(logger)
+
+    if mode == 'local':
+        return LocalWorker(logger)
+
+    if mode == 'single':
+        return None
+
+    raise ValueError(f"Unknown WORKER_MODE {mode}, expected single, process or local.")